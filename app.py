@@ -1,34 +1,64 @@
 import os
-import json
-from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for, abort
+import re
+import orjson
+from functools import lru_cache, wraps
+from flask import Flask, Response, g, request, jsonify, make_response, render_template, send_file, session, redirect, url_for, abort
+from flask.json.provider import JSONProvider
+from markupsafe import escape
 from dotenv import load_dotenv
+from diskcache import Cache
 import struct
+import hashlib
+import hmac
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
 import groq
+import redis
+import httpx
 from google import genai
 from google.genai import types
 from gtts import gTTS
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import urllib.parse
-import unicodedata
+import fugashi
 
 # Load environment variables from .env file
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson: native UTF-8 output, no \\uXXXX escaping of Japanese text."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding and re-encoding them
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype="application/json")
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Secret for session cookies. In production set FLASK_SECRET (Vercel env).
 app.secret_key = os.environ.get("FLASK_SECRET") or os.urandom(24)
 
 # Simple auth: single password stored in APP_PASSWORD (Vercel env)
 APP_PASSWORD = os.environ.get("APP_PASSWORD")
+APP_PASSWORD_BYTES = APP_PASSWORD.encode() if APP_PASSWORD else None
 
 def is_authenticated() -> bool:
     return bool(session.get("logged_in"))
 
 def login_required(fn):
-    from functools import wraps
-
     @wraps(fn)
     def wrapper(*args, **kwargs):
         # If no APP_PASSWORD configured, treat app as open (useful for local dev)
@@ -52,16 +82,81 @@ def login_required(fn):
 def inject_auth_flags():
     return {"app_password_set": bool(APP_PASSWORD), "logged_in": session.get('logged_in', False)}
 
+# Optional response cache shared by all workers; without REDIS_URL every route runs uncached
+# Short socket timeouts so an unreachable Redis behaves like a cache miss instead of stalling requests
+rds = redis.Redis.from_url(
+    os.environ["REDIS_URL"], socket_timeout=0.5, socket_connect_timeout=0.5
+) if os.environ.get("REDIS_URL") else None
+
+def cached_json(ttl=86400):
+    """Caches a JSON route's successful responses in Redis, keyed by route and request payload.
+
+    A route can set `g.skip_response_cache` to keep a degraded 200 out of the cache.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if rds is None:
+                return fn(*args, **kwargs)
+
+            payload = request.get_json(force=True, silent=True)
+            payload_json = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+            key = f"{request.path}:" + hashlib.sha256(payload_json).hexdigest()
+            try:
+                cached = rds.get(key)
+            except redis.RedisError:
+                cached = None
+            if cached is not None:
+                return Response(cached, mimetype='application/json')
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200 and not g.get("skip_response_cache"):
+                try:
+                    rds.setex(key, ttl, response.get_data())
+                except redis.RedisError:
+                    pass
+            return response
+
+        return wrapper
+
+    return decorator
+
+# Connection pool sizing for the upstream SDK clients: enough keep-alive
+# connections for many concurrent gevent requests, with HTTP/2 multiplexing.
+UPSTREAM_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60.0)
+
 # In a real application, you would get the API key from a secure source
-groq_client = groq.Groq(api_key=os.environ.get("GROQ_API_KEY"))
-gemini_client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+groq_client = groq.Groq(
+    api_key=os.environ.get("GROQ_API_KEY"),
+    http_client=httpx.Client(limits=UPSTREAM_HTTP_LIMITS, http2=True, timeout=httpx.Timeout(60.0, connect=5.0)),
+)
+# Shared across requests so connections to Google are pooled; None when no key is set
+gemini_client = genai.Client(
+    api_key=os.environ["GEMINI_API_KEY"],
+    http_options=types.HttpOptions(client_args={"limits": UPSTREAM_HTTP_LIMITS, "http2": True}),
+) if os.environ.get("GEMINI_API_KEY") else None
+# Finished TTS audio keyed by (engine, voice, text), shared by all worker processes
+tts_cache = Cache(os.environ.get("TTS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ai-japanese-tts"), size_limit=2 << 30)
 DEFAULT_MODEL = "openai/gpt-oss-120b"
+# Worker threads for overlapping independent upstream calls within one request
+io_pool = ThreadPoolExecutor(max_workers=8)
+# Separate threads for /lookup-words fan-outs, so a large batch can't starve io_pool
+lookup_pool = ThreadPoolExecutor(max_workers=16)
+# Request size limits, checked before anything is sent upstream
+MAX_TTS_CHARS = 2000
+MAX_CHAT_TOKENS_EST = 32000
+MAX_LOOKUP_WORDS = 50
+# Model id the frontend sends to get POS analysis from the local MeCab tagger instead of an LLM
+LOCAL_ANALYSIS_MODEL = "mecab"
 
 def call_model(messages, model, response_format=None):
     """
     Universal function to call different AI models (Groq or Gemini).
     """
     if model == "gemini-2.5-flash":
+        if gemini_client is None:
+            raise ValueError("GEMINI_API_KEY environment variable not set or empty.")
+
         # Convert messages to Gemini format
         gemini_contents = []
         system_message = None
@@ -152,20 +247,108 @@ Example JSON Output:
   ]
 }
 """
+# System messages are built once and shared (read-only) by every request's message list
+POS_SYSTEM_MESSAGE = {"role": "system", "content": POS_PROMPT}
+
+CHAT_STYLE_PROMPT = "Respond with a simple, natural paragraph of Japanese. Do not use markdown (like `**`, `*`, `1.`, `-`), do not repeat punctuation, and make it read like a natural spoken response."
+CHAT_STYLE_SYSTEM_MESSAGE = {"role": "system", "content": CHAT_STYLE_PROMPT}
+
+def with_chat_style_prompt(messages: list) -> list:
+    """Return a copy of `messages` whose system prompt also carries the chat style rules."""
+    if messages and messages[0].get("role") == "system":
+        system_message = {"role": "system", "content": f"{messages[0]['content']}\n\n{CHAT_STYLE_PROMPT}"}
+        return [system_message] + list(messages[1:])
+    return [CHAT_STYLE_SYSTEM_MESSAGE] + list(messages)
 
+@lru_cache(maxsize=2048)
 def analyze_text_for_pos(text_to_analyze: str, model: str) -> dict:
-    """Helper function to run POS analysis on a string."""
+    """Helper function to run POS analysis on a string.
+
+    Results are memoized per (text, model): tutor dialogs repeat the same
+    sentences a lot, and the returned dict is only ever read.
+    """
+    # Nothing to tag or annotate without kana/kanji, so skip the tagger or model call
+    if not CJK_RE.search(text_to_analyze):
+        return unanalyzed_result(text_to_analyze)
+
+    if model == LOCAL_ANALYSIS_MODEL:
+        return analyze_text_locally(text_to_analyze)
+
     messages = [
-        {"role": "system", "content": POS_PROMPT},
+        POS_SYSTEM_MESSAGE,
         {"role": "user", "content": text_to_analyze}
     ]
     
     response_content = call_model(messages, model, response_format={"type": "json_object"})
-    pos_data = json.loads(response_content)
+    pos_data = orjson.loads(response_content)
     analyzed_tokens = pos_data.get("result", [])
     return {"text": text_to_analyze, "tokens": analyzed_tokens}
 
 
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]")
+KANJI_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々〆"
+KANJI_RUN_RE = re.compile(f"[{KANJI_CHARS}]+")
+SURFACE_RUN_RE = re.compile(f"[{KANJI_CHARS}]+|[^{KANJI_CHARS}]+")
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+# UniDic POS names that have no .pos-* style, mapped to the class the LLM path would use
+LOCAL_POS_ALIASES = {
+    "補助記号": "記号",
+    "空白": "記号",
+    "代名詞": "名詞",
+    "形状詞": "形容詞",
+    "接頭辞": "その他",
+    "接尾辞": "その他",
+}
+
+@lru_cache(maxsize=None)
+def get_tagger() -> fugashi.Tagger:
+    """Loads the MeCab tagger (unidic-lite dictionary) on first use."""
+    return fugashi.Tagger()
+
+def split_furigana(surface: str, reading: str | None) -> list:
+    """Splits a word into kanji/kana runs and gives each kanji run its part of `reading`.
+
+    Uses the same token shape as POS_PROMPT, e.g. 食べ物/たべもの ->
+    食(た) べ 物(もの). If the kana runs cannot be lined up with the
+    reading, the whole word gets the full reading.
+    """
+    runs = SURFACE_RUN_RE.findall(surface)
+    if not reading or not any(KANJI_RUN_RE.fullmatch(run) for run in runs):
+        return [{"surface": surface, "is_kanji": False}]
+
+    reading = reading.translate(KATAKANA_TO_HIRAGANA)
+    pattern = "".join(
+        "(.+?)" if KANJI_RUN_RE.fullmatch(run) else f"({re.escape(run.translate(KATAKANA_TO_HIRAGANA))})"
+        for run in runs
+    )
+    match = re.fullmatch(pattern, reading)
+    if not match:
+        return [{"surface": surface, "is_kanji": True, "reading": reading}]
+
+    tokens = []
+    for run, run_reading in zip(runs, match.groups()):
+        if KANJI_RUN_RE.fullmatch(run):
+            tokens.append({"surface": run, "is_kanji": True, "reading": run_reading})
+        else:
+            tokens.append({"surface": run, "is_kanji": False})
+    return tokens
+
+def unanalyzed_result(text: str) -> dict:
+    """The whole text as a single untagged word, in the analysis result shape."""
+    return {"text": text, "tokens": [{"pos": "その他", "word_tokens": [{"surface": text, "is_kanji": False}]}]}
+
+def analyze_text_locally(text_to_analyze: str) -> dict:
+    """Runs POS analysis with MeCab, returning the same shape as the LLM path."""
+    analyzed_tokens = []
+    for word in get_tagger()(text_to_analyze):
+        pos = word.feature.pos1 or "その他"
+        analyzed_tokens.append({
+            "pos": LOCAL_POS_ALIASES.get(pos, pos),
+            "word_tokens": split_furigana(word.surface, getattr(word.feature, "kana", None)),
+        })
+    return {"text": text_to_analyze, "tokens": analyzed_tokens}
+
+
 @app.route('/')
 @login_required
 def index():
@@ -180,7 +363,8 @@ def login():
 
     if request.method == 'POST':
         pw = request.form.get('password', '')
-        if pw == APP_PASSWORD:
+        # Constant-time comparison so response timing does not leak the password
+        if hmac.compare_digest(pw.encode(), APP_PASSWORD_BYTES):
             session['logged_in'] = True
             return redirect(url_for('index'))
         else:
@@ -195,15 +379,39 @@ def logout():
     return redirect(url_for('login') if APP_PASSWORD else url_for('index'))
 
 
+# Presets are in the root directory of the app
+PRESETS_PATH = os.path.join(app.root_path, 'presets.json')
+# How often a worker re-stats presets.json to pick up edits
+PRESETS_RECHECK_SECONDS = 30
+presets_state = {"bytes": None, "etag": None, "mtime": None, "checked_at": 0.0}
+
+def load_presets() -> tuple[bytes, str]:
+    """Returns the raw presets.json bytes and their ETag, re-reading the file only when its mtime changes."""
+    now = time.monotonic()
+    if presets_state["bytes"] is None or now - presets_state["checked_at"] >= PRESETS_RECHECK_SECONDS:
+        mtime = os.path.getmtime(PRESETS_PATH)
+        if mtime != presets_state["mtime"]:
+            with open(PRESETS_PATH, 'rb') as f:
+                presets_state["bytes"] = f.read()
+            presets_state["etag"] = hashlib.sha256(presets_state["bytes"]).hexdigest()
+            presets_state["mtime"] = mtime
+        presets_state["checked_at"] = now
+    return presets_state["bytes"], presets_state["etag"]
+
+
 @app.route('/get-presets')
 @login_required
 def get_presets():
     try:
-        # Presets are in the root directory of the app
-        presets_path = os.path.join(app.root_path, 'presets.json')
-        with open(presets_path, 'r', encoding='utf-8') as f:
-            presets = json.load(f)
-        return jsonify(presets)
+        presets_bytes, presets_etag = load_presets()
+        if presets_etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(presets_bytes, mimetype='application/json')
+        response.set_etag(presets_etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = 300
+        return response
     except FileNotFoundError:
         return jsonify({"error": "Presets file not found."}), 404
     except Exception as e:
@@ -216,24 +424,21 @@ def chat():
     """
     Handles generating a conversational response from the AI.
     """
-    messages = request.json.get('messages')
-    model = request.json.get('model', DEFAULT_MODEL)
+    payload = request.get_json(force=True, silent=True) or {}
+    messages = payload.get('messages')
+    model = payload.get('model', DEFAULT_MODEL)
     if not messages:
         return jsonify({"error": "No messages provided"}), 400
+    if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+        return jsonify({"error": "Malformed messages"}), 400
+    # Rough token estimate (about 3 characters per token) to reject oversized conversations
+    if sum(len(str(m.get('content') or '')) for m in messages) // 3 > MAX_CHAT_TOKENS_EST:
+        return jsonify({"error": "Conversation too long"}), 413
 
     try:
-        # Step 1: Get the initial conversational response
-        raw_ai_text = call_model(messages, model)
-
-        # Step 2: Clean the response using a second AI call
-        cleanup_prompt = "Reformat the following text into a simple, natural paragraph of Japanese. Remove markdown (like `**`, `*`, `1.`, `-`), fix repeated punctuation, and ensure it reads like a natural spoken response. Output only the cleaned text."
-        cleanup_messages = [
-            {"role": "system", "content": cleanup_prompt},
-            {"role": "user", "content": raw_ai_text}
-        ]
-        cleaned_ai_text = call_model(cleanup_messages, model).strip()
-
-        return jsonify({"text": cleaned_ai_text})
+        # Single call: the cleanup rules ride along in the system prompt
+        ai_text = call_model(with_chat_style_prompt(messages), model).strip()
+        return jsonify({"text": ai_text})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -241,141 +446,294 @@ def chat():
 
 @app.route('/analyze', methods=['POST'])
 @login_required
+@cached_json()
 def analyze():
     """
     Performs Part-of-Speech (POS) analysis on a given text string.
     """
-    text = request.json.get('text')
-    model = request.json.get('model', DEFAULT_MODEL)
+    payload = request.get_json(force=True, silent=True) or {}
+    text = payload.get('text')
+    model = payload.get('model', DEFAULT_MODEL)
     if not text:
         return jsonify({"error": "No text provided"}), 400
 
     try:
         analysis_result = analyze_text_for_pos(text, model)
         if not analysis_result.get("tokens"):
-             return jsonify({"text": text, "tokens": [{"word": text, "furigana": "", "pos": "その他"}]})
+             return jsonify(unanalyzed_result(text))
         return jsonify(analysis_result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+EVALUATE_PROMPT = """
+You are a helpful and friendly Japanese language tutor. Your role is to evaluate a user's spoken Japanese response for a Chinese-speaking student.
+Provide your evaluation in a strict JSON format. The `explanation` field must be in Chinese.
+The JSON object must have four keys: "score", "error_html", "corrected_sentence", and "explanation".
+- "error_html": The user's original sentence, with errors wrapped in `<span class="error">...</span>` tags.
+- "corrected_sentence": The correct and natural version of the sentence.
+- "explanation": A brief, friendly, and encouraging string of feedback in Chinese.
+"""
+EVALUATE_SYSTEM_MESSAGE = {"role": "system", "content": EVALUATE_PROMPT}
+
+EVALUATE_BATCH_PROMPT = EVALUATE_PROMPT + """
+You will receive several cases at once as JSON: {"cases": [{"question": "...", "answer": "..."}, ...]}.
+Evaluate each case on its own and return {"results": [...]}, holding one evaluation object per case, in the same order as the cases.
+"""
+EVALUATE_BATCH_SYSTEM_MESSAGE = {"role": "system", "content": EVALUATE_BATCH_PROMPT}
+
+# Evaluations for the same model that arrive within this window share one model call
+EVALUATE_BATCH_WINDOW = float(os.environ.get("EVALUATE_BATCH_WINDOW_MS", 50)) / 1000
+EVALUATE_BATCH_MAX = 8
+evaluate_batch_lock = threading.Lock()
+pending_evaluations = {}
+
+# The only markup the model may put in error_html; everything else is escaped
+ERROR_SPAN_RE = re.compile(r'(<span class="error">|</span>)')
+
+def sanitize_evaluation(evaluation_data: dict) -> dict:
+    """Escapes the model-written fields the frontend renders with innerHTML."""
+    error_html = evaluation_data.get("error_html")
+    if isinstance(error_html, str):
+        parts = ERROR_SPAN_RE.split(error_html)
+        # split() with a capture group puts the allowed tags at the odd indices
+        evaluation_data["error_html"] = "".join(part if index % 2 else escape(part) for index, part in enumerate(parts))
+    for key in ("score", "corrected_sentence", "explanation"):
+        if isinstance(evaluation_data.get(key), str):
+            evaluation_data[key] = str(escape(evaluation_data[key]))
+    return evaluation_data
+
+def evaluate_single(ai_question: str, user_answer: str, model: str) -> dict:
+    """Evaluates one answer with its own model call."""
+    messages = [
+        EVALUATE_SYSTEM_MESSAGE,
+        {"role": "user", "content": f"My question to the student was: '{ai_question}'. The student's response was: '{user_answer}'. Please evaluate it."}
+    ]
+
+    response_content = call_model(messages, model, response_format={"type": "json_object"})
+    return orjson.loads(response_content)
+
+def run_evaluation_batch(items: list, model: str) -> None:
+    """Evaluates a batch in one model call and resolves each item's future.
+
+    A future resolved to None means "evaluate on your own": that is the case
+    for a batch of one, and for batches whose combined answer is unusable.
+    """
+    results = None
+    if len(items) > 1:
+        cases = [{"question": question, "answer": answer} for question, answer, _ in items]
+        messages = [
+            EVALUATE_BATCH_SYSTEM_MESSAGE,
+            {"role": "user", "content": orjson.dumps({"cases": cases}).decode()}
+        ]
+        try:
+            response_content = call_model(messages, model, response_format={"type": "json_object"})
+            results = orjson.loads(response_content).get("results")
+        except Exception:
+            results = None
+        if not isinstance(results, list) or len(results) != len(items) or not all(isinstance(r, dict) for r in results):
+            results = None
+
+    for index, (_, _, future) in enumerate(items):
+        future.set_result(results[index] if results else None)
+
+def evaluate_answer(ai_question: str, user_answer: str, model: str) -> dict:
+    """Evaluates one answer, sharing a model call with evaluations that arrive at the same time.
+
+    The first caller for a model becomes the batch leader: it waits up to
+    EVALUATE_BATCH_WINDOW for others to join (or for the batch to fill up),
+    then runs the whole batch. Everyone else just waits for their result.
+    """
+    if EVALUATE_BATCH_WINDOW <= 0:
+        return evaluate_single(ai_question, user_answer, model)
+
+    future = Future()
+    with evaluate_batch_lock:
+        batch = pending_evaluations.get(model)
+        is_leader = batch is None
+        if is_leader:
+            batch = {"items": [], "full": threading.Event()}
+            pending_evaluations[model] = batch
+        batch["items"].append((ai_question, user_answer, future))
+        if len(batch["items"]) >= EVALUATE_BATCH_MAX:
+            del pending_evaluations[model]
+            batch["full"].set()
+
+    if is_leader:
+        batch["full"].wait(EVALUATE_BATCH_WINDOW)
+        with evaluate_batch_lock:
+            if pending_evaluations.get(model) is batch:
+                del pending_evaluations[model]
+        run_evaluation_batch(batch["items"], model)
+
+    evaluation_data = future.result()
+    if evaluation_data is None:
+        evaluation_data = evaluate_single(ai_question, user_answer, model)
+    return evaluation_data
+
+
 @app.route('/evaluate', methods=['POST'])
 @login_required
 def evaluate():
     """
     Evaluates the user's response using Groq.
     """
-    ai_question = request.json.get('ai_question')
-    user_answer = request.json.get('user_answer')
-    model = request.json.get('model', DEFAULT_MODEL)
+    payload = request.get_json(force=True, silent=True) or {}
+    ai_question = payload.get('ai_question')
+    user_answer = payload.get('user_answer')
+    model = payload.get('model', DEFAULT_MODEL)
 
     if not user_answer or not ai_question:
         return jsonify({"error": "AI question or user answer missing"}), 400
 
-    system_prompt = """
-You are a helpful and friendly Japanese language tutor. Your role is to evaluate a user's spoken Japanese response for a Chinese-speaking student.
-Provide your evaluation in a strict JSON format. The `explanation` field must be in Chinese.
-The JSON object must have four keys: "score", "error_html", "corrected_sentence", and "explanation".
-- "error_html": The user's original sentence, with errors wrapped in `<span class="error">...</span>` tags.
-- "corrected_sentence": The correct and natural version of the sentence.
-- "explanation": A brief, friendly, and encouraging string of feedback in Chinese.
-"""
-
     try:
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"My question to the student was: '{ai_question}'. The student's response was: '{user_answer}'. Please evaluate it."}
-        ]
-        
-        response_content = call_model(messages, model, response_format={"type": "json_object"})
-        evaluation_data = json.loads(response_content)
-        return jsonify(evaluation_data)
+        evaluation_data = evaluate_answer(ai_question, user_answer, model)
+        return jsonify(sanitize_evaluation(evaluation_data))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def lookup_japanese(text):
+# How long Mojidict results are cached; misses expire sooner so new entries show up
+MOJIDICT_HIT_TTL = 7 * 86400
+MOJIDICT_MISS_TTL = 3600
+
+# Accent marks Mojidict puts at the end of a title: ASCII, fullwidth and circled (⓪①②...) digits
+ACCENT_DIGITS = (
+    {c: i for i, c in enumerate('0123456789')}
+    | {c: i for i, c in enumerate('０１２３４５６７８９')}
+    | {'⓪': 0}
+    | {chr(0x2460 + i): i + 1 for i in range(20)}
+)
+
+MOJIDICT_URL_PREFIX = "https://api.mojidict.com/app/mojidict/api/v1/search/all?text="
+MOJIDICT_URL_SUFFIX = "&types=102&types=106&types=103&types=671&highlight=true"
+
+# Shared keep-alive session so repeated lookups skip the TCP/TLS handshake
+moji_session = requests.Session()
+moji_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=Retry(total=2, backoff_factor=0.2)))
+moji_session.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br, zstd',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0'
+})
+
+def fetch_mojidict(text):
     """Perform a full lookup for `text` and return accent and excerpts.
 
     This single function does URL encoding, the HTTP GET, JSON parsing,
     title matching, excerpt extraction, and accent calculation.
 
-    Returns: dict {'accent_num': int|None, 'excerpts': [str,...], 'reading': str|None} or None on failure/no-match.
+    Returns: dict {'accent_num': int|None, 'excerpts': [str,...], 'reading': str|None} or None on no-match.
+    Raises requests.exceptions.RequestException on network or HTTP errors.
     """
+    url = MOJIDICT_URL_PREFIX + urllib.parse.quote(text, safe='') + MOJIDICT_URL_SUFFIX
+    resp = moji_session.get(url, timeout=(2, 5))
+    # Upstream errors must raise rather than return None, so they are never cached as misses
+    resp.raise_for_status()
+
     try:
-        quoted = urllib.parse.quote(text)
-        url = f"https://api.mojidict.com/app/mojidict/api/v1/search/all?text={quoted}&types=102&types=106&types=103&types=671&highlight=true"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br, zstd',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0'
-        }
+        data = resp.json()
+    except Exception:
+        return None
+
+    try:
+        title = data['word']['list'][0]['title']
+    except (TypeError, KeyError, IndexError):
+        return None
 
-        resp = requests.get(url, headers=headers)
-        if resp.status_code != 200:
-            return None
+    left, sep, right = title.partition('|')
+    if not sep or left.strip() != text:
+        return None
+    right = right[:-1].strip()
 
-        try:
-            data = resp.json()
-        except Exception:
-            return None
+    node = data['word']['list'][0]
+    excerpts = []
+    for k in ('excerpt', 'excerptB', 'excerptC'):
+        ex = node.get(k)
+        if not ex:
+            continue
+        # Keep the bracketed part-of-speech label at the start, e.g. "[自动・一类] ..." -> "自动・一类"
+        idx = ex.find(']')
+        excerpts.append(ex[:idx].strip()[1:] if idx >= 0 else ex)
+
+    accent_num = ACCENT_DIGITS.get(title[-1])
+
+    return {'accent_num': accent_num, 'excerpts': excerpts, 'reading': right}
+
+class MojidictMiss(Exception):
+    """Raised by lookup_japanese_cached when Mojidict has no matching entry."""
+
+# Per-process no-match deadlines (time.monotonic()), so misses expire even without Redis
+MOJIDICT_MISS_MAX = 4096
+mojidict_misses = {}
+
+@lru_cache(maxsize=4096)
+def lookup_japanese_cached(text):
+    """Mojidict lookup memoized in-process and, when configured, in Redis.
 
+    Hits stay in the lru_cache. Misses raise MojidictMiss, which lru_cache
+    never caches; they are remembered for MOJIDICT_MISS_TTL in
+    `mojidict_misses` (and Redis), so new entries show up without a restart.
+    """
+    if mojidict_misses.get(text, 0.0) > time.monotonic():
+        raise MojidictMiss(text)
+
+    redis_key = f"moji:{text}"
+    cached = None
+    if rds is not None:
         try:
-            title = data['word']['list'][0]['title']
-        except (TypeError, KeyError, IndexError):
-            return None
-
-        left = title.split('|', 1)[0].strip()
-        if left != text:
-            return None
-        right = title.split('|', 1)[1][:-1].strip()
-
-        node = data['word']['list'][0]
-        raw_excerpts = []
-        for k in ('excerpt', 'excerptB', 'excerptC'):
-            if k in node and node[k]:
-                raw_excerpts.append(node[k])
-
-        excerpts = []
-        for ex in raw_excerpts:
+            cached = rds.get(redis_key)
+        except redis.RedisError:
+            cached = None
+    if cached is not None:
+        result = orjson.loads(cached)
+    else:
+        result = fetch_mojidict(text)
+        if rds is not None:
             try:
-                txt = ex.split(']', 1)[0].strip()[1:]
-            except Exception:
-                txt = ex
-            excerpts.append(txt)
+                rds.setex(redis_key, MOJIDICT_HIT_TTL if result else MOJIDICT_MISS_TTL, orjson.dumps(result))
+            except redis.RedisError:
+                pass
 
-        try:
-            accent_num = int(unicodedata.numeric(title[-1]))
-        except Exception:
-            accent_num = None
+    if not result:
+        # Cheap bound on memory: start over rather than scan for expired entries
+        if len(mojidict_misses) >= MOJIDICT_MISS_MAX:
+            mojidict_misses.clear()
+        mojidict_misses[text] = time.monotonic() + MOJIDICT_MISS_TTL
+        raise MojidictMiss(text)
+    mojidict_misses.pop(text, None)
+    return result
 
-        return {'accent_num': accent_num, 'excerpts': excerpts, 'reading': right}
+def lookup_japanese_entry(text):
+    """Look up `text` on Mojidict; returns the fetch_mojidict result, or None on no-match.
 
-    except requests.exceptions.RequestException:
+    Raises requests.exceptions.RequestException on network or HTTP errors.
+    """
+    # Pure-ASCII input (romaji, punctuation, numbers) never matches a Japanese entry
+    if not text or text.isascii():
         return None
 
-@app.route('/explain-word', methods=['POST'])
-@login_required
-def explain_word():
-    """
-    Provides a detailed explanation for a word in the context of a sentence.
-    """
-    word = request.json.get('word')
-    sentence = request.json.get('sentence')
-    model = request.json.get('model', DEFAULT_MODEL)
+    try:
+        return lookup_japanese_cached(text)
+    except MojidictMiss:
+        return None
 
-    if not word or not sentence:
-        return jsonify({"error": "Word or sentence not provided"}), 400
+def lookup_japanese(text):
+    """Look up `text` on Mojidict; returns the fetch_mojidict result, or None on failure/no-match."""
+    try:
+        return lookup_japanese_entry(text)
+    except requests.exceptions.RequestException:
+        return None
 
-    system_prompt = """
+EXPLAIN_WORD_PROMPT = """
 You are a Japanese language expert providing detailed data for a language learning app. A user has clicked on a word within a sentence.
 Your task is to return a single JSON object with no other text. All explanatory text must be in Chinese.
 
@@ -411,20 +769,46 @@ Example for an inflected verb like "食べました":
   ]
 }
 """
+EXPLAIN_WORD_SYSTEM_MESSAGE = {"role": "system", "content": EXPLAIN_WORD_PROMPT}
+
+@app.route('/explain-word', methods=['POST'])
+@login_required
+@cached_json()
+def explain_word():
+    """
+    Provides a detailed explanation for a word in the context of a sentence.
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    word = payload.get('word')
+    sentence = payload.get('sentence')
+    model = payload.get('model', DEFAULT_MODEL)
+
+    if not word or not sentence:
+        return jsonify({"error": "Word or sentence not provided"}), 400
+
     user_prompt = f"Please explain the word '{word}' as it appears in the sentence: '{sentence}'"
 
     try:
         messages = [
-            {"role": "system", "content": system_prompt},
+            EXPLAIN_WORD_SYSTEM_MESSAGE,
             {"role": "user", "content": user_prompt}
         ]
         
-        response_content = call_model(messages, model, response_format={"type": "json_object"})
-        explanation_data = json.loads(response_content)
+        # Clicked words are usually already in dictionary form, so look the word up while the model runs
+        word_lookup_future = io_pool.submit(lookup_japanese_entry, word)
+        explanation_data = orjson.loads(call_model(messages, model, response_format={"type": "json_object"}))
 
         dictionary_form = explanation_data.get("dictionary_form")
         if dictionary_form:
-            lookup_result = lookup_japanese(dictionary_form)
+            try:
+                if dictionary_form == word:
+                    lookup_result = word_lookup_future.result()
+                else:
+                    lookup_result = lookup_japanese_entry(dictionary_form)
+            except requests.exceptions.RequestException:
+                # Unlike a genuine no-match, a failed lookup is transient: don't pin this answer in the cache
+                g.skip_response_cache = True
+                lookup_result = None
             if lookup_result:
                 explanation_data['pitch_accent'] = lookup_result.get('accent_num')
                 explanation_data['hiragana'] = lookup_result.get('reading')
@@ -442,22 +826,46 @@ Example for an inflected verb like "食べました":
     except Exception as e:
         return jsonify({"error": f"Error explaining word: {str(e)}"}), 500
 
+@app.route('/lookup-words', methods=['POST'])
+@login_required
+def lookup_words():
+    """
+    Looks up several words on Mojidict at once, fanning the lookups out concurrently.
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    words = payload.get('words')
+
+    if not isinstance(words, list) or not words or not all(isinstance(w, str) and w for w in words):
+        return jsonify({"error": "No words provided"}), 400
+    if len(words) > MAX_LOOKUP_WORDS:
+        return jsonify({"error": "Too many words"}), 413
+
+    try:
+        unique_words = list(dict.fromkeys(words))
+        results = dict(zip(unique_words, lookup_pool.map(lookup_japanese, unique_words)))
+        return jsonify({"results": results})
+    except Exception as e:
+        return jsonify({"error": f"Error looking up words: {str(e)}"}), 500
+
+TRANSLATE_PROMPT = "You are a helpful translation assistant. Translate the following Japanese text to Chinese. Return only the translated text, with no other explanations or surrounding text."
+TRANSLATE_SYSTEM_MESSAGE = {"role": "system", "content": TRANSLATE_PROMPT}
+
 @app.route('/translate', methods=['POST'])
 @login_required
+@cached_json()
 def translate():
     """
     Translates a text to Chinese using Groq AI.
     """
-    text = request.json.get('text')
-    model = request.json.get('model', DEFAULT_MODEL)
+    payload = request.get_json(force=True, silent=True) or {}
+    text = payload.get('text')
+    model = payload.get('model', DEFAULT_MODEL)
     if not text:
         return jsonify({"error": "No text provided"}), 400
 
     try:
-        system_prompt = "You are a helpful translation assistant. Translate the following Japanese text to Chinese. Return only the translated text, with no other explanations or surrounding text."
-
         messages = [
-            {"role": "system", "content": system_prompt},
+            TRANSLATE_SYSTEM_MESSAGE,
             {"role": "user", "content": text}
         ]
         
@@ -468,22 +876,25 @@ def translate():
         return jsonify({"error": f"Error during translation: {str(e)}"}), 500
 
 
+PUNCTUATE_PROMPT = "You are a helpful assistant. Add appropriate Japanese punctuation (like 、 and 。) to the following text. Do not change the words. Only return the punctuated text, with no other explanations or surrounding text."
+PUNCTUATE_SYSTEM_MESSAGE = {"role": "system", "content": PUNCTUATE_PROMPT}
+
 @app.route('/punctuate', methods=['POST'])
 @login_required
+@cached_json()
 def punctuate():
     """
     Adds punctuation to a raw text string using Groq AI.
     """
-    raw_text = request.json.get('text')
-    model = request.json.get('model', DEFAULT_MODEL)
+    payload = request.get_json(force=True, silent=True) or {}
+    raw_text = payload.get('text')
+    model = payload.get('model', DEFAULT_MODEL)
     if not raw_text:
         return jsonify({"error": "No text provided"}), 400
 
     try:
-        system_prompt = "You are a helpful assistant. Add appropriate Japanese punctuation (like 、 and 。) to the following text. Do not change the words. Only return the punctuated text, with no other explanations or surrounding text."
-
         messages = [
-            {"role": "system", "content": system_prompt},
+            PUNCTUATE_SYSTEM_MESSAGE,
             {"role": "user", "content": raw_text}
         ]
         
@@ -499,53 +910,45 @@ def synthesize_speech():
     """
     Generates speech from text using either Gemini or gTTS engine.
     """
-    text = request.json.get('text')
-    engine = request.json.get('engine', 'gemini') # Default to gemini
+    payload = request.get_json(force=True, silent=True) or {}
+    text = payload.get('text')
+    engine = payload.get('engine', 'gemini') # Default to gemini
+    voice_name = payload.get('voice_name', 'Zephyr')
 
     if not text:
         return jsonify({"error": "No text provided"}), 400
+    if not isinstance(text, str):
+        return jsonify({"error": "Malformed text"}), 400
+    if len(text) > MAX_TTS_CHARS:
+        return jsonify({"error": "Text too long"}), 413
 
     try:
         if engine == 'gtts':
-            tts = gTTS(text=text, lang='ja')
-            mp3_fp = BytesIO()
-            tts.write_to_fp(mp3_fp)
-            mp3_fp.seek(0)
-            return send_file(mp3_fp, mimetype='audio/mpeg')
+            # Join gTTS's per-part MP3 bytes directly instead of going through write_to_fp;
+            # the whole clip is still collected before responding so errors come back as JSON
+            mp3_data = b"".join(gTTS(text=text, lang='ja').stream())
+            if not mp3_data:
+                return jsonify({"error": "No audio data received from gTTS."}), 500
 
-        elif engine == 'gemini':
-            voice_name = request.json.get('voice_name', 'Zephyr')
-            api_key = os.environ.get("GEMINI_API_KEY")
-            if not api_key:
-                raise ValueError("GEMINI_API_KEY environment variable not set or empty.")
+            return send_file(BytesIO(mp3_data), mimetype='audio/mpeg')
 
-            client = genai.Client(api_key=api_key)
-            model = "gemini-2.5-flash-preview-tts"
-            contents = [types.Content(role="user", parts=[types.Part.from_text(text=text)])]
-            generate_content_config = types.GenerateContentConfig(
-                response_modalities=["audio"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice_name)
-                    )
-                ),
-            )
+        elif engine == 'gemini':
+            cache_key = tts_cache_key(engine, voice_name, text)
+            cached_wav = get_cached_audio(cache_key)
+            if cached_wav is not None:
+                return send_file(BytesIO(cached_wav), mimetype='audio/wav')
 
-            audio_buffer = BytesIO()
-            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=generate_content_config):
-                if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
-                    part = chunk.candidates[0].content.parts[0]
-                    if part.inline_data and part.inline_data.data:
-                        audio_buffer.write(part.inline_data.data)
+            if gemini_client is None:
+                raise ValueError("GEMINI_API_KEY environment variable not set or empty.")
 
-            raw_audio_data = audio_buffer.getvalue()
+            # Buffer the whole clip so an upstream failure mid-stream still comes back as a JSON 500
+            raw_audio_data = b"".join(iter_gemini_audio(gemini_client, text, voice_name))
             if not raw_audio_data:
                 return jsonify({"error": "No audio data received from API. Check parameters."}), 500
 
             wav_data = convert_to_wav(raw_audio_data, "audio/L16;rate=24000")
-            wav_buffer = BytesIO(wav_data)
-            wav_buffer.seek(0)
-            return send_file(wav_buffer, mimetype='audio/wav')
+            store_cached_audio(cache_key, wav_data)
+            return send_file(BytesIO(wav_data), mimetype='audio/wav')
 
         else:
             return jsonify({"error": "Invalid TTS engine specified"}), 400
@@ -555,6 +958,62 @@ def synthesize_speech():
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
 
 
+def tts_cache_key(engine: str, voice_name: str, text: str) -> bytes:
+    """Builds the cache key for synthesized audio."""
+    return hashlib.blake2b(f"{engine}|{voice_name}|{text}".encode(), digest_size=16).digest()
+
+
+def get_cached_audio(cache_key: bytes) -> bytes | None:
+    """Looks synthesized audio up on local disk first, then in Redis when configured."""
+    audio = tts_cache.get(cache_key)
+    if audio is None and rds is not None:
+        try:
+            audio = rds.get(b"tts:" + cache_key)
+        except redis.RedisError:
+            audio = None
+        if audio is not None:
+            tts_cache.set(cache_key, audio)
+    return audio
+
+
+def store_cached_audio(cache_key: bytes, audio: bytes) -> None:
+    """Stores synthesized audio on local disk and, when configured, in Redis."""
+    tts_cache.set(cache_key, audio)
+    if rds is not None:
+        try:
+            rds.setex(b"tts:" + cache_key, 7 * 86400, audio)
+        except redis.RedisError:
+            pass
+
+
+@lru_cache(maxsize=32)
+def gemini_tts_config(voice_name: str) -> types.GenerateContentConfig:
+    """Builds (once per voice) the Gemini request config for audio output."""
+    return types.GenerateContentConfig(
+        response_modalities=["audio"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice_name)
+            )
+        ),
+    )
+
+
+def iter_gemini_audio(client, text: str, voice_name: str):
+    """Yields raw PCM chunks from the Gemini TTS stream as they arrive."""
+    model = "gemini-2.5-flash-preview-tts"
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text=text)])]
+
+    for chunk in client.models.generate_content_stream(model=model, contents=contents, config=gemini_tts_config(voice_name)):
+        if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+            part = chunk.candidates[0].content.parts[0]
+            if part.inline_data and part.inline_data.data:
+                yield part.inline_data.data
+
+
+# Canonical 44-byte RIFF/WAVE header layout, compiled once.
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
 def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
     """Generates a WAV file header for the given audio data and parameters."""
     parameters = parse_audio_mime_type(mime_type)
@@ -567,32 +1026,25 @@ def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
     byte_rate = sample_rate * block_align
     chunk_size = 36 + data_size
 
-    header = struct.pack(
-        "<4sI4s4sIHHIIHH4sI",
+    header = WAV_HEADER.pack(
         b"RIFF", chunk_size, b"WAVE", b"fmt ", 16, 1, num_channels, sample_rate,
         byte_rate, block_align, bits_per_sample, b"data", data_size
     )
-    return header + audio_data
+    return b"".join((header, audio_data))
 
+AUDIO_BITS_RE = re.compile(r"audio/L(\d+)")
+AUDIO_RATE_RE = re.compile(r"rate=(\d+)", re.IGNORECASE)
+
+@lru_cache(maxsize=8)
 def parse_audio_mime_type(mime_type: str) -> dict[str, int | None]:
     """Parses bits per sample and rate from an audio MIME type string."""
-    bits_per_sample = 16
-    rate = 24000
-    parts = mime_type.split(";")
-    for param in parts:
-        param = param.strip()
-        if param.lower().startswith("rate="):
-            try:
-                rate = int(param.split("=", 1)[1])
-            except (ValueError, IndexError):
-                pass
-        elif param.startswith("audio/L"):
-            try:
-                bits_per_sample = int(param.split("L", 1)[1])
-            except (ValueError, IndexError):
-                pass
-    return {"bits_per_sample": bits_per_sample, "rate": rate}
-
+    bits_match = AUDIO_BITS_RE.search(mime_type)
+    rate_match = AUDIO_RATE_RE.search(mime_type)
+    return {
+        "bits_per_sample": int(bits_match.group(1)) if bits_match else 16,
+        "rate": int(rate_match.group(1)) if rate_match else 24000,
+    }
 
 if __name__ == '__main__':
-    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
+    # Development server only; the Werkzeug debugger is opt-in via FLASK_DEBUG=1
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", use_reloader=False, host='0.0.0.0', port=5000)
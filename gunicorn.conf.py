@@ -0,0 +1,11 @@
+import multiprocessing
+import os
+
+# Every route spends nearly all of its time waiting on Groq / Gemini / gTTS,
+# so run gevent workers: the worker monkey-patches sockets before it imports
+# app.py, and each process can keep many upstream calls in flight at once.
+bind = os.environ.get("GUNICORN_BIND") or f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = 60
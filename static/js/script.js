@@ -77,7 +77,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function loadSettings() {
         modelSelects.conversation.value = localStorage.getItem('settings-model-conversation') || 'openai/gpt-oss-120b';
-        modelSelects.analysis.value = localStorage.getItem('settings-model-analysis') || 'openai/gpt-oss-120b';
+        modelSelects.analysis.value = localStorage.getItem('settings-model-analysis') || 'mecab';
         modelSelects.evaluation.value = localStorage.getItem('settings-model-evaluation') || 'openai/gpt-oss-120b';
         modelSelects.explanation.value = localStorage.getItem('settings-model-explanation') || 'openai/gpt-oss-120b';
         modelSelects.formatting.value = localStorage.getItem('settings-model-formatting') || 'openai/gpt-oss-20b';